@@ -1,10 +1,15 @@
 # app/auth.py
+import asyncio
 import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from fastapi import HTTPException, status
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from dotenv import load_dotenv
 
+from app.metrics import stage
+
 load_dotenv()
 
 # JWT settings
@@ -12,8 +17,25 @@ SECRET_KEY = os.getenv("JWT_SECRET")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
 
+# Password hashing pool: "thread" (argon2 releases the GIL) or "process"
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+# Hash jobs allowed to wait or run at once before new ones get a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 8))
+
+# Optional argon2 cost overrides; existing hashes are upgraded on next login
+_ARGON2_SETTINGS = {
+    f"argon2__{name}": int(os.environ[env])
+    for name, env in (
+        ("time_cost", "ARGON2_TIME_COST"),
+        ("memory_cost", "ARGON2_MEMORY_COST"),
+        ("parallelism", "ARGON2_PARALLELISM"),
+    )
+    if os.getenv(env)
+}
+
 # Use argon2 for password hashing
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto", **_ARGON2_SETTINGS)
 
 # Hash password
 def get_password_hash(password: str):
@@ -23,6 +45,65 @@ def get_password_hash(password: str):
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
+# Verify password and return a fresh hash if its parameters are outdated
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+# -------------------------
+# Off-loop hashing
+# -------------------------
+_executor: Executor | None = None
+_hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+_pending_jobs = 0
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+            )
+    return _executor
+
+
+async def _run_hash_job(fn, *args):
+    """Run a hashing call in the pool, failing fast when the queue is full."""
+    global _pending_jobs
+    if _pending_jobs >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending_jobs += 1
+    try:
+        with stage("password_hash"):
+            async with _hash_slots:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pending_jobs -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash_job(get_password_hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    """Returns (valid, new_hash); new_hash is None unless a rehash is due."""
+    return await _run_hash_job(verify_and_update_password, plain_password, hashed_password)
+
+
+def shutdown_password_hashing():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
 # Create JWT token
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
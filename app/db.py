@@ -3,10 +3,12 @@ import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
+from app.metrics import MongoCommandListener
+
 load_dotenv()
 
 MONGODB_URI = os.getenv("MONGODB_URI")
-client = AsyncIOMotorClient(MONGODB_URI)
+client = AsyncIOMotorClient(MONGODB_URI, event_listeners=[MongoCommandListener()])
 
 # Explicitly pick your database
-db = client["helpdesk"]
+db = client[os.getenv("MONGODB_DB", "helpdesk")]
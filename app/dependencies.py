@@ -4,6 +4,8 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from app.db import db
 from app.auth import SECRET_KEY, ALGORITHM
+from app.metrics import stage
+from app.principal_cache import principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -11,18 +13,35 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 async def get_db():
     return db
 
-# ✅ Authentication dependency
+# ✅ Authentication dependency (shared by every router)
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        if email is None:
+    with stage("auth"):
+        return await _load_current_user(token)
+
+async def _load_current_user(token: str):
+    # Signature checks are memoized per token until it expires
+    payload = principal_cache.get_claims(token)
+    if payload is None:
+        try:
+            with stage("jwt_decode"):
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token"
             )
+        principal_cache.set_claims(token, payload)
+
+    email = payload.get("sub")
+    if email is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
 
-        user = await db["users"].find_one({"email": email})
+    user = principal_cache.get_user(email)
+    if user is None:
+        user = await db["users"].find_one({"email": email}, {"password": 0})
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -30,9 +49,5 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             )
 
         user["_id"] = str(user["_id"])  # Convert ObjectId to str
-        return user
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token"
-        )
+        principal_cache.set_user(email, user, payload.get("exp"))
+    return user
@@ -0,0 +1,163 @@
+# app/indexes.py
+import argparse
+import asyncio
+import os
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+
+# Set to run check_query_plans at startup and refuse to boot on a COLLSCAN or in-memory SORT
+CHECK_QUERY_PLANS = os.getenv("CHECK_QUERY_PLANS", "").lower() in ("1", "true", "yes")
+
+# -------------------------
+# Required indexes
+# -------------------------
+INDEXES = {
+    "users": [
+        # Login/signup lookups; unique also closes the duplicate-signup race
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "tickets": [
+        IndexModel([("assigned_to", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)], name="assigned_to_status_id"),
+        # An agent's dashboard without a status filter, in _id order
+        IndexModel([("assigned_to", ASCENDING), ("_id", ASCENDING)], name="assigned_to_id"),
+        IndexModel([("created_by", ASCENDING), ("_id", ASCENDING)], name="created_by_id"),
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="status_id"),
+    ],
+    "agents": [
+        # Roster loads and least-open-tickets selection
+        IndexModel([("is_active", ASCENDING), ("open_tickets", ASCENDING), ("_id", ASCENDING)], name="active_open_tickets"),
+        # open_tickets counter updates
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+}
+
+
+class DuplicateKeysError(RuntimeError):
+    pass
+
+
+async def _find_duplicates(db: AsyncIOMotorDatabase, collection: str, fields: list[str], limit: int = 20) -> list:
+    """Values of `fields` shared by more than one document (at most `limit`)."""
+    pipeline = [
+        {"$group": {"_id": {field: f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return await db[collection].aggregate(pipeline, allowDiskUse=True).to_list(length=limit)
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """
+    Create every required index; a no-op when they already exist.
+    Before building a missing unique index, existing duplicates are reported
+    with DuplicateKeysError instead of a bare OperationFailure.
+    """
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+        for model in models:
+            spec = model.document
+            if not spec.get("unique") or spec["name"] in existing:
+                continue
+            fields = list(spec["key"])
+            duplicates = await _find_duplicates(db, collection, fields)
+            if duplicates:
+                values = ", ".join(f"{row['_id']} (x{row['count']})" for row in duplicates)
+                raise DuplicateKeysError(
+                    f"Cannot create unique index {spec['name']} on {collection}: duplicate "
+                    f"{'/'.join(fields)} values {values}. Merge or delete the extra documents and restart."
+                )
+        await db[collection].create_indexes(models)
+
+
+# -------------------------
+# Query plan checks
+# -------------------------
+class QueryPlanError(RuntimeError):
+    pass
+
+
+_SAMPLE_ID = ObjectId()
+_AFTER = {"_id": {"$gt": _SAMPLE_ID}}
+_BY_ID = [("_id", ASCENDING)]
+
+# (collection, filter, sort) for every query the routers and services issue
+QUERY_SHAPES = [
+    ("users", {"email": "someone@example.com"}, None),
+    ("users", {}, _BY_ID),
+    ("users", _AFTER, _BY_ID),
+    ("tickets", {"_id": _SAMPLE_ID}, None),
+    ("tickets", {}, _BY_ID),
+    ("tickets", _AFTER, _BY_ID),
+    ("tickets", {"status": "open", **_AFTER}, _BY_ID),
+    ("tickets", {"assigned_to": "agent@example.com", **_AFTER}, _BY_ID),
+    ("tickets", {"assigned_to": "agent@example.com", "status": "open", **_AFTER}, _BY_ID),
+    ("tickets", {"created_by": "user@example.com", **_AFTER}, _BY_ID),
+    ("tickets", {"created_by": "user@example.com", "status": "open", **_AFTER}, _BY_ID),
+    ("agents", {"is_active": True}, _BY_ID),
+    ("agents", {"is_active": True}, [("open_tickets", ASCENDING), ("_id", ASCENDING)]),
+    ("agents", {"email": "agent@example.com"}, None),
+    ("system_state", {"_id": "assignment"}, None),
+    ("ticket_stats", {"_id": "tickets"}, None),
+]
+
+
+def _plan_stages(plan) -> list[str]:
+    """Every `stage` name in an explain plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def check_query_plans(db: AsyncIOMotorDatabase) -> list[dict]:
+    """
+    Explain every query shape and raise QueryPlanError if any winning plan
+    scans a whole collection or, for shapes with a sort, sorts in memory
+    instead of reading an index in order. Returns the per-shape stages.
+    """
+    report = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.limit(1).explain()
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        report.append({"collection": collection, "filter": query, "sort": sort, "stages": stages})
+
+    problems = []
+    for entry in report:
+        if "COLLSCAN" in entry["stages"]:
+            problems.append(("COLLSCAN", entry))
+        elif entry["sort"] and "SORT" in entry["stages"]:
+            problems.append(("in-memory SORT", entry))
+    if problems:
+        shapes = "; ".join(
+            f"{reason}: {entry['collection']} {entry['filter']} sort={entry['sort']}" for reason, entry in problems
+        )
+        raise QueryPlanError(f"{len(problems)} query shape(s) without a usable index: {shapes}")
+    return report
+
+
+async def _main(check: bool):
+    from app.db import db
+
+    await ensure_indexes(db)
+    print("✅ Indexes are in place")
+    if check:
+        for entry in await check_query_plans(db):
+            print(f"{entry['collection']:>12} {entry['filter']} -> {' > '.join(entry['stages'])}")
+        print("✅ No query shape needs a collection scan or an in-memory sort")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create indexes and optionally verify query plans")
+    parser.add_argument("--check", action="store_true", help="explain every query shape and fail on COLLSCAN or in-memory SORT")
+    asyncio.run(_main(parser.parse_args().check))
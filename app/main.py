@@ -1,28 +1,77 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException, Depends, status
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from jose import jwt, JWTError
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from typing import Literal, Optional
+
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 
-from app.auth import get_password_hash, verify_password, create_access_token
+from app.auth import (
+    create_access_token,
+    hash_password_async,
+    shutdown_password_hashing,
+    verify_and_update_password_async,
+)
 from app.db import db  # ✅ Use shared DB connection
+from app.dependencies import get_current_user  # ✅ Shared, cached auth dependency
+from app.indexes import CHECK_QUERY_PLANS, check_query_plans, ensure_indexes
+from app.metrics import MetricsMiddleware, registry as metrics_registry
+from app.principal_cache import principal_cache
+from app.serialization import MongoJSONResponse
+from app.services.ticket_feed import stop_ticket_feed
+from app.services.ticket_stats import TICKET_STATS_RECONCILE_SECONDS, run_stats_reconciler
+from app.services.write_coalescer import close_ticket_writer
 from app.routers import tickets  # ✅ Tickets router
+from app.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    build_projection,
+    fetch_page,
+    keyset_query,
+    parse_after,
+    stream_ndjson,
+)
 
 # -------------------------
-# Initialize FastAPI App
+# Lifespan (startup / shutdown)
 # -------------------------
-app = FastAPI(title="Ticketing System API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes(db)
+    if CHECK_QUERY_PLANS:
+        await check_query_plans(db)  # raises QueryPlanError on any COLLSCAN or in-memory SORT
 
-# Include Router
-app.include_router(tickets.router)
+    reconciler = None
+    if TICKET_STATS_RECONCILE_SECONDS > 0:
+        reconciler = asyncio.create_task(run_stats_reconciler(db))
+
+    yield
+
+    if reconciler:
+        reconciler.cancel()
+        with suppress(asyncio.CancelledError):
+            await reconciler
+    await stop_ticket_feed()
+    await close_ticket_writer()  # flush any coalesced ticket inserts
+    shutdown_password_hashing()
 
 # -------------------------
-# OAuth2 Configuration
+# Initialize FastAPI App
 # -------------------------
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+app = FastAPI(title="Ticketing System API", lifespan=lifespan)
+
+# Request timing / DB command attribution for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Include Router
+app.include_router(tickets.router)
 
 # -------------------------
 # Pydantic Models
@@ -42,10 +91,14 @@ async def signup(user: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     user_dict = user.dict()
-    user_dict["password"] = get_password_hash(user_dict["password"])
+    user_dict["password"] = await hash_password_async(user_dict["password"])
     user_dict["created_at"] = datetime.utcnow()
 
-    result = await db["users"].insert_one(user_dict)
+    # The unique email index catches signups racing past the check above
+    try:
+        result = await db["users"].insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     return {"id": str(result.inserted_id), "email": user.email}
 
 # -------------------------
@@ -54,47 +107,78 @@ async def signup(user: UserCreate):
 @app.post("/auth/login")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await db["users"].find_one({"email": form_data.username})
-    if not user or not verify_password(form_data.password, user["password"]):
+    if not user:
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
+    valid, new_hash = await verify_and_update_password_async(form_data.password, user["password"])
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid email or password")
+
+    # Hash parameters changed since this password was stored: upgrade it
+    if new_hash:
+        await db["users"].update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+        principal_cache.invalidate_user(user["email"])
+
     access_token = create_access_token({"sub": user["email"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
 # -------------------------
-# Auth Dependency
+# Protected Route (Example)
+# -------------------------
+@app.get("/users/me")
+async def read_me(current_user: dict = Depends(get_current_user)):
+    return current_user
+
+# -------------------------
+# Auth cache counters
 # -------------------------
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    from app.auth import SECRET_KEY, ALGORITHM
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+@app.get("/auth/cache-stats")
+async def auth_cache_stats():
+    return principal_cache.stats()
+
+
+def principal_cache_metrics() -> list[str]:
+    lines = ["# TYPE helpdesk_principal_cache_lookups_total counter"]
+    for cache, stats in principal_cache.stats().items():
+        lines.append(f'helpdesk_principal_cache_lookups_total{{cache="{cache}",result="hit"}} {stats["hits"]}')
+        lines.append(f'helpdesk_principal_cache_lookups_total{{cache="{cache}",result="miss"}} {stats["misses"]}')
+    return lines
 
-        user = await db["users"].find_one({"email": email})
-        if user is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
-        user["_id"] = str(user["_id"])
-        return user
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+metrics_registry.add_collector(principal_cache_metrics)
 
 # -------------------------
-# Protected Route (Example)
+# Prometheus metrics
 # -------------------------
-@app.get("/users/me")
-async def read_me(current_user: dict = Depends(get_current_user)):
-    return current_user
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 # -------------------------
 # Public Route (List Users)
 # -------------------------
-@app.get("/users")
-async def get_users():
-    users = []
-    cursor = db["users"].find({})
-    async for user in cursor:
-        user["_id"] = str(user["_id"])
-        users.append(user)
-    return users
+# Password hashes are never loaded, whatever `fields` asks for
+USER_HIDDEN_FIELDS = ("password",)
+
+
+@app.get("/users", response_class=MongoJSONResponse)
+async def get_users(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Return users after this _id"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    format: Literal["json", "ndjson"] = "json",
+):
+    query = keyset_query({}, parse_after(after))
+    projection = build_projection(fields, hidden=USER_HIDDEN_FIELDS)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(db["users"], query, projection, limit),
+            media_type="application/x-ndjson",
+        )
+
+    users, next_after = await fetch_page(
+        db["users"], query, projection, limit or DEFAULT_PAGE_SIZE
+    )
+    headers = {NEXT_CURSOR_HEADER: next_after} if next_after else None
+    return MongoJSONResponse(users, headers=headers)
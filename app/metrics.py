@@ -0,0 +1,267 @@
+# app/metrics.py
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger("app.metrics")
+
+# Log a per-stage breakdown for requests slower than this (0 disables)
+SLOW_REQUEST_LOG_MS = float(os.getenv("SLOW_REQUEST_LOG_MS", 0))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Commands issued outside an HTTP request (startup, background jobs)
+BACKGROUND_ROUTE = "background"
+DEFAULT_STAGE = "handler"
+
+
+# -------------------------
+# Metric primitives
+# -------------------------
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are interpolated within a bucket."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= target and bucket_count:
+                if index == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                upper = LATENCY_BUCKETS[index]
+                return lower + (upper - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+        return LATENCY_BUCKETS[-1]
+
+
+class RequestStats:
+    """Per-request timings: seconds per stage and (count, seconds) per DB command."""
+
+    __slots__ = ("stages", "db")
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.db: dict[tuple[str, str], list] = {}
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+_current_stage: contextvars.ContextVar[str] = contextvars.ContextVar("current_stage", default=DEFAULT_STAGE)
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+# -------------------------
+# Registry
+# -------------------------
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests_total: dict[tuple, int] = {}
+        self.request_duration: dict[str, Histogram] = {}
+        self.stage_duration: dict[tuple, Histogram] = {}
+        self.db_commands_total: dict[tuple, int] = {}
+        self.db_command_seconds: dict[tuple, float] = {}
+        self.db_command_duration: dict[str, Histogram] = {}
+        self._collectors: list[Callable[[], list[str]]] = []
+
+    def add_collector(self, collector: Callable[[], list[str]]):
+        """Register a callable returning extra exposition lines for /metrics."""
+        self._collectors.append(collector)
+
+    def record_command(self, command: str, seconds: float):
+        stats = _request_stats.get()
+        stage_name = _current_stage.get()
+        with self._lock:
+            self.db_command_duration.setdefault(command, Histogram()).observe(seconds)
+            if stats is None:
+                self._count_commands(BACKGROUND_ROUTE, stage_name, command, 1, seconds)
+                return
+            entry = stats.db.setdefault((stage_name, command), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def record_stage(self, stats: RequestStats, stage_name: str, seconds: float):
+        with self._lock:
+            stats.stages[stage_name] = stats.stages.get(stage_name, 0.0) + seconds
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            key = (method, route, status)
+            self.requests_total[key] = self.requests_total.get(key, 0) + 1
+            self.request_duration.setdefault(route, Histogram()).observe(seconds)
+            for stage_name, stage_seconds in stats.stages.items():
+                self.stage_duration.setdefault((route, stage_name), Histogram()).observe(stage_seconds)
+            for (stage_name, command), (count, command_seconds) in stats.db.items():
+                self._count_commands(route, stage_name, command, count, command_seconds)
+
+    def _count_commands(self, route: str, stage_name: str, command: str, count: int, seconds: float):
+        key = (route, stage_name, command)
+        self.db_commands_total[key] = self.db_commands_total.get(key, 0) + count
+        self.db_command_seconds[key] = self.db_command_seconds.get(key, 0.0) + seconds
+
+    def request_db_commands(self) -> int:
+        """Total Mongo commands attributed to HTTP requests so far."""
+        with self._lock:
+            return sum(count for (route, _, _), count in self.db_commands_total.items() if route != BACKGROUND_ROUTE)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ["# HELP helpdesk_http_requests_total HTTP requests by route and status.",
+                      "# TYPE helpdesk_http_requests_total counter"]
+            for (method, route, status), count in self.requests_total.items():
+                lines.append(f"helpdesk_http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+            _render_histograms(lines, "helpdesk_http_request_duration_seconds", "HTTP request latency by route.",
+                               {(("route", route),): hist for route, hist in self.request_duration.items()})
+            _render_histograms(lines, "helpdesk_stage_duration_seconds", "Time spent per request stage.",
+                               {(("route", route), ("stage", stage_name)): hist
+                                for (route, stage_name), hist in self.stage_duration.items()})
+            _render_histograms(lines, "helpdesk_db_command_duration_seconds", "MongoDB command latency.",
+                               {(("command", command),): hist for command, hist in self.db_command_duration.items()})
+
+            lines += ["# HELP helpdesk_db_commands_total MongoDB commands by route and stage.",
+                      "# TYPE helpdesk_db_commands_total counter"]
+            for (route, stage_name, command), count in self.db_commands_total.items():
+                lines.append(f"helpdesk_db_commands_total{_labels(route=route, stage=stage_name, command=command)} {count}")
+            lines += ["# HELP helpdesk_db_command_seconds_total MongoDB command time by route and stage.",
+                      "# TYPE helpdesk_db_command_seconds_total counter"]
+            for (route, stage_name, command), seconds in self.db_command_seconds.items():
+                lines.append(f"helpdesk_db_command_seconds_total{_labels(route=route, stage=stage_name, command=command)} {seconds:.6f}")
+
+        for collector in self._collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+
+def _render_histograms(lines: list[str], name: str, help_text: str, histograms: dict[tuple, Histogram]):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, hist in histograms.items():
+        cumulative = 0
+        for bound, bucket_count in zip((*LATENCY_BUCKETS, "+Inf"), hist.counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_labels(**dict(labels), le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(**dict(labels))} {hist.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**dict(labels))} {hist.count}")
+
+    quantile_name = name.replace("_seconds", "_quantile_seconds")
+    lines += [f"# HELP {quantile_name} p50/p95/p99 estimated from {name}.", f"# TYPE {quantile_name} gauge"]
+    for labels, hist in histograms.items():
+        for q in QUANTILES:
+            lines.append(f"{quantile_name}{_labels(**dict(labels), quantile=q)} {hist.quantile(q):.6f}")
+
+
+registry = MetricsRegistry()
+
+
+# -------------------------
+# Instrumentation hooks
+# -------------------------
+@contextmanager
+def stage(name: str):
+    """
+    Attribute the enclosed time, and any Mongo commands issued inside it,
+    to `name` for the current request. Nested stages are timed separately.
+    """
+    token = _current_stage.set(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        stats = _request_stats.get()
+        if stats is not None:
+            registry.record_stage(stats, name, time.perf_counter() - started)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Counts every command against the request and stage that issued it.
+    Motor runs commands on its executor with a copy of the caller's context,
+    so the request's context variables are visible here.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        registry.record_command(event.command_name, event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        registry.record_command(event.command_name, event.duration_micros / 1_000_000)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request and folding its stats into the registry."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+
+            # Label by route template, never the raw path, to bound cardinality
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            registry.record_request(scope["method"], route, status_code, elapsed, stats)
+            if SLOW_REQUEST_LOG_MS and elapsed * 1000 >= SLOW_REQUEST_LOG_MS:
+                _log_slow_request(scope["method"], route, status_code, elapsed, stats)
+
+
+def _log_slow_request(method: str, route: str, status_code: int, elapsed: float, stats: RequestStats):
+    stage_parts = [f"{name} {seconds * 1000:.1f} ms" for name, seconds in stats.stages.items()]
+    db_parts = [
+        f"{command}@{stage_name} x{count} {seconds * 1000:.1f} ms"
+        for (stage_name, command), (count, seconds) in stats.db.items()
+    ]
+    logger.warning(
+        "Slow request %s %s -> %s in %.1f ms | stages: %s | db: %s",
+        method, route, status_code, elapsed * 1000,
+        ", ".join(stage_parts) or "-", ", ".join(db_parts) or "-",
+    )
@@ -0,0 +1,106 @@
+# app/pagination.py
+import re
+from typing import AsyncIterator, Iterable, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.serialization import dumps_mongo
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Documents pulled per getMore while streaming, and bytes buffered per write
+STREAM_BATCH_SIZE = 500
+STREAM_CHUNK_BYTES = 64 * 1024
+
+NEXT_CURSOR_HEADER = "X-Next-After"
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+# -------------------------
+# Query building
+# -------------------------
+def parse_after(after: Optional[str]) -> Optional[ObjectId]:
+    """Turn the opaque `after` cursor back into an ObjectId."""
+    if after is None:
+        return None
+    try:
+        return ObjectId(after)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor")
+
+
+def build_projection(fields: Optional[str], hidden: Iterable[str] = ()) -> Optional[dict]:
+    """
+    Build a Mongo projection from a comma separated `fields` parameter.
+    `_id` is always returned because it doubles as the pagination cursor,
+    and anything listed in `hidden` is never returned.
+    """
+    hidden = set(hidden)
+    if not fields:
+        return {name: 0 for name in hidden} or None
+
+    projection = {}
+    for name in (part.strip() for part in fields.split(",")):
+        if not name:
+            continue
+        if not _FIELD_NAME.match(name):
+            raise HTTPException(status_code=400, detail=f"Invalid field name: {name}")
+        if name in hidden or name.split(".")[0] in hidden:
+            continue
+        projection[name] = 1
+    projection["_id"] = 1
+    return projection
+
+
+def keyset_query(filters: dict, after: Optional[ObjectId]) -> dict:
+    """Equality filters plus the `_id > after` keyset condition."""
+    query = {key: value for key, value in filters.items() if value is not None}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    return query
+
+
+# -------------------------
+# Page / stream readers
+# -------------------------
+async def fetch_page(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    projection: Optional[dict],
+    limit: int,
+) -> tuple[list[dict], Optional[str]]:
+    """Read one page ordered by `_id`; returns the docs and the next cursor."""
+    cursor = collection.find(query, projection).sort("_id", 1).limit(limit)
+    docs = await cursor.to_list(length=limit)
+    next_after = str(docs[-1]["_id"]) if len(docs) == limit else None
+    return docs, next_after
+
+
+async def stream_ndjson(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    projection: Optional[dict],
+    limit: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yield matching documents as NDJSON while the cursor produces them.
+    Only one batch of documents and one output chunk are held at a time.
+    """
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(STREAM_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    buffer = bytearray()
+    async for doc in cursor:
+        buffer += dumps_mongo(doc)
+        buffer += b"\n"
+        if len(buffer) >= STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,91 @@
+# app/principal_cache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+
+
+class TTLCache:
+    """Bounded LRU map whose entries also expire at an absolute wall-clock time."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class PrincipalCache:
+    """
+    Caches what `get_current_user` needs per request:
+    verified token claims (keyed by token) and user documents (keyed by email).
+    Nothing outlives PRINCIPAL_CACHE_TTL_SECONDS or the token's `exp`.
+    """
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.tokens = TTLCache(maxsize)
+        self.users = TTLCache(maxsize)
+
+    def _expiry(self, token_exp: Optional[float]) -> float:
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+        return expires_at
+
+    def get_claims(self, token: str) -> Optional[dict]:
+        return self.tokens.get(token)
+
+    def set_claims(self, token: str, claims: dict):
+        self.tokens.set(token, claims, self._expiry(claims.get("exp")))
+
+    def get_user(self, email: str) -> Optional[dict]:
+        user = self.users.get(email)
+        # Hand out copies so callers can't mutate the cached principal
+        return dict(user) if user is not None else None
+
+    def set_user(self, email: str, user: dict, token_exp: Optional[float] = None):
+        self.users.set(email, dict(user), self._expiry(token_exp))
+
+    def invalidate_user(self, email: str):
+        """Call whenever a user document changes or is removed."""
+        self.users.pop(email)
+
+    def clear(self):
+        self.tokens.clear()
+        self.users.clear()
+
+    def stats(self) -> dict:
+        return {"tokens": self.tokens.stats(), "users": self.users.stats()}
+
+
+principal_cache = PrincipalCache()
@@ -1,14 +1,51 @@
 # app/routers/tickets.py
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from typing import AsyncIterator, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 
-from app.services.assignment import assign_agent_round_robin
+from app.services.assignment import get_assignment_strategy
+from app.services.ticket_stats import count_status_change, count_tickets_created, get_ticket_stats
+from app.services.ticket_feed import ResumeTokenExpired, get_ticket_feed
+from app.services.write_coalescer import get_ticket_writer
+from app.services.workload import (
+    TICKET_STATUSES,
+    adjust_open_tickets,
+    adjust_open_tickets_many,
+    record_status_change,
+)
 from app.dependencies import get_current_user, get_db   # ✅ Correct source
+from app.metrics import stage
+from app.serialization import MongoJSONResponse, dumps_mongo
+from app.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    build_projection,
+    fetch_page,
+    keyset_query,
+    parse_after,
+    stream_ndjson,
+)
+
+logger = logging.getLogger("app.tickets")
 
 router = APIRouter(prefix="/tickets", tags=["Tickets"])
 
+# Tickets written per insert_many during bulk ingestion
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", 1000))
+MAX_BULK_INSERT_CHUNK_SIZE = 10000
+
 
 # -------------------------------
 # 📘 Pydantic model for ticket input
@@ -18,62 +55,313 @@ class TicketCreate(BaseModel):
     description: str
 
 
-# -------------------------------
-# 🧰 Utility: Serialize MongoDB documents
-# -------------------------------
-def serialize_mongo_doc(doc: dict):
-    """Convert MongoDB ObjectId to str so FastAPI can return it."""
-    if not doc:
-        return doc
-    if "_id" in doc and isinstance(doc["_id"], ObjectId):
-        doc["_id"] = str(doc["_id"])
-    return doc
+class TicketStatusUpdate(BaseModel):
+    status: Literal[TICKET_STATUSES]
 
 
-def serialize_mongo_docs(docs: list[dict]):
-    """Convert list of MongoDB docs."""
-    return [serialize_mongo_doc(doc) for doc in docs]
+# -------------------------------
+# 🧰 Utility: Build ticket documents
+# -------------------------------
+def build_ticket_document(ticket: TicketCreate, current_user: dict, agent: dict) -> dict:
+    """The document stored for a newly created, auto-assigned ticket."""
+    return {
+        "title": ticket.title,
+        "description": ticket.description,
+        "created_by": current_user["email"],
+        "assigned_to": agent["email"],
+        "status": "open"
+    }
 
 
 # -------------------------------
 # 🎯 POST /tickets — create and auto-assign ticket
 # -------------------------------
-@router.post("/", response_model=dict)
+@router.post("/", response_model=dict, response_class=MongoJSONResponse)
 async def create_ticket(
     ticket: TicketCreate,
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    # 1. Assign agent using round-robin
-    agent = await assign_agent_round_robin(db)
+    # 1. Assign agent using the configured strategy
+    strategy = get_assignment_strategy()
+    with stage("assignment"):
+        agent = await strategy.assign(db)
     if not agent:
         raise HTTPException(status_code=500, detail="No agents available")
 
     # 2. Prepare ticket data
-    ticket_data = {
-        "title": ticket.title,
-        "description": ticket.description,
-        "created_by": current_user["email"],
-        "assigned_to": agent["email"],
-        "status": "open"
-    }
+    ticket_data = build_ticket_document(ticket, current_user, agent)
+
+    # 3. Insert ticket into MongoDB (ticket_data["_id"] is set either way).
+    #    A warm create is three sequential round trips: the assignment, the
+    #    insert (with the open_tickets $inc run concurrently when the strategy
+    #    left it to us) and the stats $inc.
+    with stage("insert"):
+        writer = get_ticket_writer(db)
+        operations = [writer.insert(ticket_data) if writer else db["tickets"].insert_one(ticket_data)]
+        if not strategy.counts_on_assign:
+            operations.append(adjust_open_tickets(db, agent["email"], 1))
+        inserted, *counted = await asyncio.gather(*operations, return_exceptions=True)
+
+        slot_taken = not counted or not isinstance(counted[0], BaseException)
+        if isinstance(inserted, BaseException):
+            # The ticket was not written: give the agent's open slot back
+            if slot_taken:
+                await adjust_open_tickets(db, agent["email"], -1)
+            raise inserted
+        if not slot_taken:
+            # The ticket exists, so don't fail the request; the backfill in
+            # app.services.workload repairs the counter
+            logger.warning("Could not count ticket %s for %s: %s", ticket_data["_id"], agent["email"], counted[0])
+        await count_tickets_created(db, [ticket_data])
+
+    # 4. Return the inserted document without reading it back
+    return MongoJSONResponse(ticket_data)
+
+
+# -------------------------------
+# 📦 POST /tickets/bulk — import many tickets at once
+# -------------------------------
+async def iter_bulk_items(request: Request) -> AsyncIterator[tuple[int, object, Optional[str]]]:
+    """
+    Yield (index, item, parse_error) from a JSON array body or, for
+    application/x-ndjson, from each line of the streamed body.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type and "jsonl" not in content_type:
+        try:
+            items = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array")
+        for index, item in enumerate(items):
+            yield index, item, None
+        return
+
+    index = 0
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield (index, *_parse_ndjson_line(line))
+                index += 1
+    if pending.strip():
+        yield (index, *_parse_ndjson_line(pending))
+
+
+def _parse_ndjson_line(line: bytes) -> tuple[object, Optional[str]]:
+    try:
+        return json.loads(line), None
+    except ValueError as exc:
+        return None, f"Invalid JSON: {exc}"
+
+
+async def insert_ticket_chunk(
+    db: AsyncIOMotorDatabase,
+    chunk: list[tuple[int, TicketCreate]],
+    current_user: dict,
+) -> list[dict]:
+    """Assign and insert one chunk of validated tickets; returns per-item results."""
+    with stage("assignment"):
+        agents = await get_assignment_strategy().assign_many(db, len(chunk))
+    if not agents:
+        return [{"index": index, "ok": False, "error": "No agents available"} for index, _ in chunk]
+
+    documents = [
+        build_ticket_document(ticket, current_user, agent)
+        for (_, ticket), agent in zip(chunk, agents)
+    ]
+
+    failed = {}
+    try:
+        with stage("insert"):
+            await db["tickets"].insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        failed = {error["index"]: error["errmsg"] for error in exc.details.get("writeErrors", [])}
+
+    # Tickets that were not written give their agent's open slot back
+    if failed:
+        released = Counter(documents[position]["assigned_to"] for position in failed)
+        await adjust_open_tickets_many(db, {email: -n for email, n in released.items()})
+
+    await count_tickets_created(db, (document for position, document in enumerate(documents) if position not in failed))
+
+    results = []
+    for position, ((index, _), document) in enumerate(zip(chunk, documents)):
+        if position in failed:
+            results.append({"index": index, "ok": False, "error": failed[position]})
+        else:
+            results.append({
+                "index": index,
+                "ok": True,
+                "_id": str(document["_id"]),
+                "assigned_to": document["assigned_to"],
+            })
+    return results
 
-    # 3. Insert ticket into MongoDB
-    result = await db["tickets"].insert_one(ticket_data)
-    created_ticket = await db["tickets"].find_one({"_id": result.inserted_id})
 
-    # 4. Return serialized document
-    return serialize_mongo_doc(created_ticket)
+@router.post("/bulk", response_model=dict, response_class=MongoJSONResponse)
+async def bulk_create_tickets(
+    request: Request,
+    chunk_size: int = Query(BULK_INSERT_CHUNK_SIZE, ge=1, le=MAX_BULK_INSERT_CHUNK_SIZE),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    results = []
+    chunk: list[tuple[int, TicketCreate]] = []
+
+    async for index, item, parse_error in iter_bulk_items(request):
+        if parse_error:
+            results.append({"index": index, "ok": False, "error": parse_error})
+            continue
+        try:
+            chunk.append((index, TicketCreate.model_validate(item)))
+        except ValidationError as exc:
+            errors = exc.errors(include_url=False, include_context=False, include_input=False)
+            results.append({"index": index, "ok": False, "error": errors})
+            continue
+
+        if len(chunk) >= chunk_size:
+            results.extend(await insert_ticket_chunk(db, chunk, current_user))
+            chunk = []
+
+    if chunk:
+        results.extend(await insert_ticket_chunk(db, chunk, current_user))
+
+    results.sort(key=lambda result: result["index"])
+    created = sum(1 for result in results if result["ok"])
+    return MongoJSONResponse({"created": created, "failed": len(results) - created, "results": results})
 
 
 # -------------------------------
-# 📋 GET /tickets — list all tickets
+# 📋 GET /tickets — list tickets (keyset paginated)
 # -------------------------------
-@router.get("/", response_model=list[dict])
+@router.get("/", response_model=list[dict], response_class=MongoJSONResponse)
 async def list_tickets(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Return tickets after this _id"),
+    status: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    created_by: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    format: Literal["json", "ndjson"] = "json",
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    query = keyset_query(
+        {"status": status, "assigned_to": assigned_to, "created_by": created_by},
+        parse_after(after),
+    )
+    projection = build_projection(fields)
+
+    # NDJSON streams every match unless a limit is given
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(db["tickets"], query, projection, limit),
+            media_type="application/x-ndjson",
+        )
+
+    tickets, next_after = await fetch_page(
+        db["tickets"], query, projection, limit or DEFAULT_PAGE_SIZE
+    )
+    headers = {NEXT_CURSOR_HEADER: next_after} if next_after else None
+    return MongoJSONResponse(tickets, headers=headers)
+
+
+# -------------------------------
+# 📊 GET /tickets/stats — counts by status, agent and creator
+# -------------------------------
+@router.get("/stats", response_model=dict, response_class=MongoJSONResponse)
+async def ticket_stats(
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    # One document read, maintained incrementally; see services/ticket_stats.py
+    return MongoJSONResponse(await get_ticket_stats(db))
+
+
+# -------------------------------
+# 🔄 PATCH /tickets/{id}/status — change ticket status
+# -------------------------------
+@router.patch("/{ticket_id}/status", response_model=dict, response_class=MongoJSONResponse)
+async def update_ticket_status(
+    ticket_id: str,
+    update: TicketStatusUpdate,
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    tickets_cursor = db["tickets"].find({})
-    tickets = await tickets_cursor.to_list(None)
-    return serialize_mongo_docs(tickets)
+    if not ObjectId.is_valid(ticket_id):
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    ticket_oid = ObjectId(ticket_id)
+
+    # Only a real transition is applied, so counters are adjusted exactly once
+    previous = await db["tickets"].find_one_and_update(
+        {"_id": ticket_oid, "status": {"$ne": update.status}},
+        {"$set": {"status": update.status}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if previous is None:
+        ticket = await db["tickets"].find_one({"_id": ticket_oid})
+        if ticket is None:
+            raise HTTPException(status_code=404, detail="Ticket not found")
+        return MongoJSONResponse(ticket)
+
+    await record_status_change(db, previous["assigned_to"], previous["status"], update.status)
+    await count_status_change(db, previous, previous["status"], update.status)
+
+    previous["status"] = update.status
+    return MongoJSONResponse(previous)
+
+
+# -------------------------------
+# 📡 WS /tickets/feed — live ticket creations and status changes
+# -------------------------------
+@router.websocket("/feed")
+async def ticket_feed(
+    websocket: WebSocket,
+    token: str = Query(..., description="Bearer token (browsers cannot set WS headers)"),
+    assigned_to: Optional[str] = None,
+    status: Optional[str] = None,
+    resume_after: Optional[str] = Query(None, description="Last resume_token the client received"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
+    try:
+        await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    feed = get_ticket_feed(db)
+    try:
+        subscriber = await feed.subscribe(assigned_to, status, resume_after)
+    except ResumeTokenExpired:
+        await websocket.send_text('{"event":"resume_failed","detail":"Token too old, reload via GET /tickets"}')
+        await websocket.close(code=4410)
+        return
+
+    async def forward_events():
+        while True:
+            event = await subscriber.next_event()
+            await websocket.send_text(dumps_mongo(event).decode())
+            if event["event"] in ("dropped", "error"):
+                await websocket.close(code=1013)
+                return
+
+    async def wait_for_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.ensure_future(forward_events()), asyncio.ensure_future(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        feed.unsubscribe(subscriber)
@@ -12,13 +12,18 @@ db = client["helpdesk"]  # Make sure this matches your DB name in main.py
 
 async def seed_agents():
     agents = [
-        {"name": "Agent A", "email": "agentA@example.com", "is_active": True, "assigned_tickets": []},
-        {"name": "Agent B", "email": "agentB@example.com", "is_active": True, "assigned_tickets": []},
-        {"name": "Agent C", "email": "agentC@example.com", "is_active": True, "assigned_tickets": []}
+        {"name": "Agent A", "email": "agentA@example.com", "is_active": True, "open_tickets": 0},
+        {"name": "Agent B", "email": "agentB@example.com", "is_active": True, "open_tickets": 0},
+        {"name": "Agent C", "email": "agentC@example.com", "is_active": True, "open_tickets": 0}
     ]
 
     await db.agents.delete_many({})  # optional: clear existing agents
     await db.agents.insert_many(agents)
+
+    # Bump the roster version so running API workers reload their agent cache
+    await db.system_state.update_one(
+        {"_id": "assignment"}, {"$inc": {"agents_version": 1}}, upsert=True
+    )
     print("✅ Seeded sample agents successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+# app/serialization.py
+import json
+from datetime import date, datetime
+from uuid import UUID
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import JSONResponse
+
+
+class _MongoJSONEncoder(json.JSONEncoder):
+    """Encodes the BSON types our documents contain; everything else is plain JSON."""
+
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        if isinstance(obj, (Decimal128, UUID)):
+            return str(obj)
+        return super().default(obj)
+
+
+_encoder = _MongoJSONEncoder(ensure_ascii=False, separators=(",", ":"), check_circular=False)
+
+
+def dumps_mongo(content) -> bytes:
+    """Mongo documents (or lists of them) straight to UTF-8 JSON in one pass."""
+    return _encoder.encode(content).encode("utf-8")
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    JSONResponse that renders raw Mongo documents with `dumps_mongo`.
+    Return it from the endpoint so FastAPI skips response validation and
+    jsonable_encoder.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps_mongo(content)
@@ -1,24 +1,196 @@
+import asyncio
+import heapq
+import os
+import time
+from collections import Counter
+from typing import Optional
+
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 
-async def assign_agent_round_robin(db: AsyncIOMotorDatabase):
+from app.services.workload import adjust_open_tickets_many
+
+# Single document in 'system_state' holding the round-robin counter and the
+# agent roster version (bumped whenever the agents collection changes)
+ASSIGNMENT_STATE_ID = "assignment"
+
+AGENT_ROSTER_TTL_SECONDS = float(os.getenv("AGENT_ROSTER_TTL_SECONDS", 30))
+
+# Which AssignmentStrategy.name new tickets are routed with
+ASSIGNMENT_STRATEGY = os.getenv("ASSIGNMENT_STRATEGY", "round_robin")
+
+
+class AgentRoster:
     """
-    Pick the next active agent using round-robin logic.
-    Keeps state in the 'system_state' collection.
+    In-process cache of active agents.
+    Reloaded when the TTL expires or when the stored roster version changes.
+    """
+
+    def __init__(self, ttl_seconds: float = AGENT_ROSTER_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._agents: list[dict] = []
+        self._version: Optional[int] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_stale(self, version: Optional[int]) -> bool:
+        if time.monotonic() >= self._expires_at:
+            return True
+        return version is not None and version != self._version
+
+    async def get(self, db: AsyncIOMotorDatabase, version: Optional[int] = None) -> list[dict]:
+        if not self._is_stale(version):
+            return self._agents
+
+        # Only one coroutine reloads; the others wait and reuse its result
+        async with self._lock:
+            if self._is_stale(version):
+                self._agents = await db.agents.find({"is_active": True}).sort("_id", 1).to_list(length=None)
+                self._version = version
+                self._expires_at = time.monotonic() + self.ttl_seconds
+        return self._agents
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+
+agent_roster = AgentRoster()
+
+
+async def reserve_round_robin_agents(db: AsyncIOMotorDatabase, count: int) -> list[dict]:
+    """
+    Reserve `count` consecutive round-robin slots with one atomic $inc and
+    return the agent for each slot (empty when nobody is active).
+    The agents themselves come from the cached roster.
     """
-    agents = await db.agents.find({"is_active": True}).to_list(length=None)
+    state = await db.system_state.find_one_and_update(
+        {"_id": ASSIGNMENT_STATE_ID},
+        {"$inc": {"round_robin_counter": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    agents = await agent_roster.get(db, state.get("agents_version", 0))
     if not agents:
-        return None
+        return []
+
+    first_slot = state["round_robin_counter"] - count
+    return [agents[(first_slot + offset) % len(agents)] for offset in range(count)]
 
-    # Fetch or initialize state
-    state = await db.system_state.find_one({}) or {}
-    last_index = state.get("last_assigned_index", -1)  # ✅ default to -1
 
-    next_index = (last_index + 1) % len(agents)
-    next_agent = agents[next_index]
+async def assign_agent_round_robin(db: AsyncIOMotorDatabase):
+    """
+    Pick the next active agent using round-robin logic.
+    The counter is advanced atomically, so concurrent callers never share a slot.
+    """
+    agents = await reserve_round_robin_agents(db, 1)
+    return agents[0] if agents else None
 
-    # Update or insert state safely
+
+async def bump_agents_version(db: AsyncIOMotorDatabase):
+    """Call after changing the agents collection so every worker reloads its roster."""
     await db.system_state.update_one(
-        {}, {"$set": {"last_assigned_index": next_index}}, upsert=True
+        {"_id": ASSIGNMENT_STATE_ID}, {"$inc": {"agents_version": 1}}, upsert=True
     )
+    agent_roster.invalidate()
+
+
+# -------------------------
+# Assignment strategies
+# -------------------------
+class AssignmentStrategy:
+    """
+    Picks the agent for a new ticket.
+    `assign` returns the agent document (or None when nobody is active). It
+    counts the new ticket in that agent's `open_tickets` counter when
+    `counts_on_assign` is set; otherwise the caller must, and can do so
+    alongside the insert instead of before it.
+    `assign_many` returns one agent per ticket (or an empty list) and always
+    counts the batch; override it when a batch can be cheaper than a loop.
+    """
+
+    name = ""
+    counts_on_assign = True
+
+    async def assign(self, db: AsyncIOMotorDatabase) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def assign_many(self, db: AsyncIOMotorDatabase, count: int) -> list[dict]:
+        agents = []
+        for _ in range(count):
+            agent = await self.assign(db)
+            if agent is None:
+                if self.counts_on_assign:
+                    # Ran out of agents part way: hand back the slots already taken
+                    released = Counter(assigned["email"] for assigned in agents)
+                    await adjust_open_tickets_many(db, {email: -n for email, n in released.items()})
+                return []
+            agents.append(agent)
+        if not self.counts_on_assign:
+            await adjust_open_tickets_many(db, Counter(agent["email"] for agent in agents))
+        return agents
+
+
+class RoundRobinStrategy(AssignmentStrategy):
+    name = "round_robin"
+    # The pick doesn't depend on the counters, so the $inc can ride with the insert
+    counts_on_assign = False
+
+    async def assign(self, db: AsyncIOMotorDatabase) -> Optional[dict]:
+        return await assign_agent_round_robin(db)
+
+    async def assign_many(self, db: AsyncIOMotorDatabase, count: int) -> list[dict]:
+        agents = await reserve_round_robin_agents(db, count)
+        if agents:
+            await adjust_open_tickets_many(db, Counter(agent["email"] for agent in agents))
+        return agents
+
+
+class LeastOpenTicketsStrategy(AssignmentStrategy):
+    """
+    Give the ticket to the active agent with the fewest open tickets.
+    Selection and the counter bump are one find_one_and_update on the agents
+    collection, so the cost does not depend on how many tickets exist.
+    """
+
+    name = "least_open"
+
+    async def assign(self, db: AsyncIOMotorDatabase) -> Optional[dict]:
+        return await db.agents.find_one_and_update(
+            {"is_active": True},
+            {"$inc": {"open_tickets": 1}},
+            sort=[("open_tickets", 1), ("_id", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def assign_many(self, db: AsyncIOMotorDatabase, count: int) -> list[dict]:
+        # One roster read, then spread the batch over the least loaded agents
+        active = await db.agents.find({"is_active": True}).sort("_id", 1).to_list(length=None)
+        if not active:
+            return []
+
+        heap = [(agent.get("open_tickets", 0), position) for position, agent in enumerate(active)]
+        heapq.heapify(heap)
+        agents = []
+        for _ in range(count):
+            open_tickets, position = heapq.heappop(heap)
+            agents.append(active[position])
+            heapq.heappush(heap, (open_tickets + 1, position))
+
+        await adjust_open_tickets_many(db, Counter(agent["email"] for agent in agents))
+        return agents
+
+
+STRATEGIES = {cls.name: cls for cls in (RoundRobinStrategy, LeastOpenTicketsStrategy)}
+
+_strategy: Optional[AssignmentStrategy] = None
+
 
-    return next_agent
+def get_assignment_strategy() -> AssignmentStrategy:
+    """Return the strategy configured by ASSIGNMENT_STRATEGY."""
+    global _strategy
+    if _strategy is None:
+        if ASSIGNMENT_STRATEGY not in STRATEGIES:
+            raise ValueError(f"Unknown ASSIGNMENT_STRATEGY: {ASSIGNMENT_STRATEGY}")
+        _strategy = STRATEGIES[ASSIGNMENT_STRATEGY]()
+    return _strategy
@@ -0,0 +1,280 @@
+# app/services/ticket_feed.py
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger("app.ticket_feed")
+
+# Events buffered per subscriber before it is dropped as a slow consumer
+TICKET_FEED_QUEUE_SIZE = int(os.getenv("TICKET_FEED_QUEUE_SIZE", 256))
+# Recent events kept so reconnecting clients can resume from their last token
+TICKET_FEED_REPLAY_SIZE = int(os.getenv("TICKET_FEED_REPLAY_SIZE", 1000))
+# Most events a reconnecting client may be behind when catching up from MongoDB
+TICKET_FEED_CATCHUP_LIMIT = int(os.getenv("TICKET_FEED_CATCHUP_LIMIT", 10000))
+TICKET_FEED_RETRY_SECONDS = 2.0
+
+# ChangeStreamFatalError / ChangeStreamHistoryLost: our resume token is unusable
+_UNRESUMABLE_CODES = (280, 286)
+
+# Ticket creations and status changes only
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": "insert"},
+        {"operationType": "update", "updateDescription.updatedFields.status": {"$exists": True}},
+    ]}},
+]
+
+# Control messages a subscriber's queue can end with
+FEED_DROPPED = {"event": "dropped", "detail": "Client too slow, reconnect with resume_after"}
+FEED_FAILED = {"event": "error", "detail": "Ticket feed interrupted, reconnect with resume_after"}
+
+
+class ResumeTokenExpired(Exception):
+    pass
+
+
+class Subscriber:
+    """
+    One connected client: its filters, the backlog it missed while away
+    (sent first, not limited by the queue size) and a bounded queue of live events.
+    """
+
+    def __init__(self, assigned_to: Optional[str], status: Optional[str], queue_size: int):
+        self.assigned_to = assigned_to
+        self.status = status
+        self.backlog: deque[dict] = deque()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # While catching up: the newest token this client has seen, how many
+        # events the shared stream has read for it, and when it goes live
+        self.resume_after: Optional[str] = None
+        self.missed = 0
+        self.caught_up: Optional[asyncio.Future] = None
+
+    def matches(self, event: dict) -> bool:
+        ticket = event["ticket"]
+        if self.assigned_to is not None and ticket.get("assigned_to") != self.assigned_to:
+            return False
+        return self.status is None or ticket.get("status") == self.status
+
+    def offer(self, event: dict) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def next_event(self) -> dict:
+        if self.backlog:
+            return self.backlog.popleft()
+        return await self.queue.get()
+
+    def close(self, message: dict):
+        """Discard everything pending and leave only `message` for the sender."""
+        self.backlog.clear()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+def change_to_event(change: dict) -> dict:
+    """Shape a change stream document into the message sent to clients."""
+    if change["operationType"] == "insert":
+        kind, ticket = "created", change["fullDocument"]
+    else:
+        kind = "status_changed"
+        ticket = change.get("fullDocument") or {
+            "_id": change["documentKey"]["_id"],
+            **change["updateDescription"]["updatedFields"],
+        }
+    return {"event": kind, "resume_token": change["_id"]["_data"], "ticket": ticket}
+
+
+class TicketFeed:
+    """
+    One change stream on the tickets collection per worker, fanned out to
+    every subscriber. The stream starts with the first subscriber and keeps
+    its position, so it picks up where it left off after errors.
+
+    Clients resuming from a token older than the stream's position are
+    served by the same stream: it rewinds to the oldest such token, fills
+    their backlogs, skips what live subscribers already had, and attaches
+    them once it is level again. Resume token `_data` strings sort in stream
+    order (hex-encoded KeyStrings), which is what the comparisons rely on.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, queue_size: int, replay_size: int):
+        self.collection = collection
+        self.queue_size = queue_size
+        self._subscribers: set[Subscriber] = set()
+        self._catching_up: set[Subscriber] = set()
+        self._replay: deque[dict] = deque(maxlen=replay_size)
+        # Newest token handed to live subscribers (or seen while idle)
+        self._position: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def subscribe(self, assigned_to: Optional[str] = None, status: Optional[str] = None,
+                        resume_after: Optional[str] = None) -> Subscriber:
+        """
+        Register a subscriber. With `resume_after`, the events it missed are
+        put in its backlog: from this worker's replay buffer when the token is
+        still there, otherwise from the shared stream rewound to that token,
+        in which case this waits until the client is caught up. Raises
+        ResumeTokenExpired if MongoDB can't resume from the token or the
+        client is more than TICKET_FEED_CATCHUP_LIMIT events behind.
+        """
+        subscriber = Subscriber(assigned_to, status, self.queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        if resume_after is None:
+            self._subscribers.add(subscriber)
+            return subscriber
+
+        tokens = [event["resume_token"] for event in self._replay]
+        if resume_after in tokens:
+            missed = list(self._replay)[tokens.index(resume_after) + 1:]
+            subscriber.backlog.extend(event for event in missed if subscriber.matches(event))
+            self._subscribers.add(subscriber)
+            return subscriber
+
+        subscriber.resume_after = resume_after
+        subscriber.caught_up = asyncio.get_running_loop().create_future()
+        self._catching_up.add(subscriber)
+        try:
+            await subscriber.caught_up
+        finally:
+            self._catching_up.discard(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def _end_catch_up(self, subscriber: Subscriber, error: Optional[Exception] = None, attach: bool = True):
+        """Wake the waiting subscribe() call, attaching the client to the live fan-out."""
+        self._catching_up.discard(subscriber)
+        if subscriber.caught_up.done():  # the client went away meanwhile
+            return
+        if error is not None:
+            subscriber.caught_up.set_exception(error)
+            return
+        if attach:
+            self._subscribers.add(subscriber)
+        subscriber.caught_up.set_result(None)
+
+    def _publish(self, event: dict):
+        self._replay.append(event)
+        for subscriber in list(self._subscribers):
+            if subscriber.matches(event) and not subscriber.offer(event):
+                self._subscribers.discard(subscriber)
+                subscriber.close(FEED_DROPPED)
+
+    def _advance(self, start: Optional[str], end: str, event: Optional[dict] = None):
+        """
+        The shared stream moved from `start` to `end`, reading `event` on the
+        way (None when it went idle at that high-water mark).
+        """
+        for subscriber in list(self._catching_up):
+            # Only clients whose token this stream has read contiguously from
+            if start is None or not start <= subscriber.resume_after < end:
+                continue
+            subscriber.resume_after = end
+            if event is not None:
+                subscriber.missed += 1
+                if subscriber.matches(event):
+                    subscriber.backlog.append(event)
+            if subscriber.missed > TICKET_FEED_CATCHUP_LIMIT:
+                self._end_catch_up(subscriber, ResumeTokenExpired(end))
+
+        if self._position is None or end > self._position:
+            self._position = end
+            if event is not None:
+                self._publish(event)
+
+        if end >= self._position:
+            for subscriber in list(self._catching_up):
+                if subscriber.resume_after == end:
+                    self._end_catch_up(subscriber)
+
+    def _must_rewind(self, read_point: Optional[str]) -> bool:
+        return read_point is not None and any(
+            subscriber.resume_after < read_point for subscriber in self._catching_up
+        )
+
+    def _start_token(self) -> Optional[str]:
+        # Without a position, open at "now" first to learn it
+        if self._position is None:
+            return None
+        return min([self._position, *(subscriber.resume_after for subscriber in self._catching_up)])
+
+    async def _run(self):
+        while True:
+            start = self._start_token()
+            opened = False
+            try:
+                async with self.collection.watch(
+                    CHANGE_STREAM_PIPELINE,
+                    full_document="updateLookup",
+                    resume_after={"_data": start} if start else None,
+                ) as stream:
+                    read_point = start
+                    while not self._must_rewind(read_point):
+                        change = await stream.try_next()
+                        opened = True
+                        if change is not None:
+                            event = change_to_event(change)
+                            self._advance(read_point, event["resume_token"], event)
+                            read_point = event["resume_token"]
+                        elif stream.resume_token is not None:
+                            self._advance(read_point, stream.resume_token["_data"])
+                            read_point = stream.resume_token["_data"]
+            except PyMongoError as exc:
+                rejected = [subscriber for subscriber in self._catching_up if subscriber.resume_after == start]
+                if isinstance(exc, OperationFailure) and not opened and start != self._position and rejected:
+                    # MongoDB can't resume from a reconnecting client's token:
+                    # fail only those clients and go back to the live position
+                    for subscriber in rejected:
+                        self._end_catch_up(subscriber, ResumeTokenExpired(start))
+                    continue
+
+                logger.warning("Ticket change stream failed, retrying: %s", exc)
+                if isinstance(exc, OperationFailure) and exc.code in _UNRESUMABLE_CODES:
+                    self._position = None
+                # Clients reconnect with their last token and replay the gap
+                for subscriber in list(self._subscribers):
+                    subscriber.close(FEED_FAILED)
+                self._subscribers.clear()
+                for subscriber in list(self._catching_up):
+                    subscriber.close(FEED_FAILED)
+                    self._end_catch_up(subscriber, attach=False)
+                await asyncio.sleep(TICKET_FEED_RETRY_SECONDS)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_ticket_feed: Optional[TicketFeed] = None
+
+
+def get_ticket_feed(db: AsyncIOMotorDatabase) -> TicketFeed:
+    global _ticket_feed
+    if _ticket_feed is None:
+        _ticket_feed = TicketFeed(db["tickets"], TICKET_FEED_QUEUE_SIZE, TICKET_FEED_REPLAY_SIZE)
+    return _ticket_feed
+
+
+async def stop_ticket_feed():
+    global _ticket_feed
+    if _ticket_feed is not None:
+        await _ticket_feed.stop()
+        _ticket_feed = None
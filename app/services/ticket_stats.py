@@ -0,0 +1,185 @@
+# app/services/ticket_stats.py
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Iterable
+from urllib.parse import unquote
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import ConfigurationError, OperationFailure, PyMongoError
+
+logger = logging.getLogger("app.ticket_stats")
+
+# Single counters document in the 'ticket_stats' collection
+TICKET_STATS_ID = "tickets"
+# How often the counters are rebuilt from the tickets collection (0 disables)
+TICKET_STATS_RECONCILE_SECONDS = float(os.getenv("TICKET_STATS_RECONCILE_SECONDS", 3600))
+# Rebuilds retried when the snapshot expires before the aggregation finishes
+TICKET_STATS_REBUILD_ATTEMPTS = 3
+
+# SnapshotTooOld, SnapshotUnavailable: worth another try
+_SNAPSHOT_RETRY_CODES = (239, 246)
+# Breakdowns holding counts; everything else in the document is metadata
+_COUNTER_FIELDS = ("total", "by_status", "by_agent", "by_creator")
+
+
+def _key(value) -> str:
+    """Emails contain dots, which Mongo would read as nested paths."""
+    return str(value).replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _paths(ticket: dict, status: str) -> list[str]:
+    return [
+        f"by_status.{_key(status)}",
+        f"by_agent.{_key(ticket.get('assigned_to'))}.{_key(status)}",
+        f"by_creator.{_key(ticket.get('created_by'))}.{_key(status)}",
+    ]
+
+
+async def _apply(db: AsyncIOMotorDatabase, increments: Counter):
+    increments = {path: delta for path, delta in increments.items() if delta}
+    if increments:
+        await db.ticket_stats.update_one({"_id": TICKET_STATS_ID}, {"$inc": increments}, upsert=True)
+
+
+# -------------------------
+# Incremental updates
+# -------------------------
+async def count_tickets_created(db: AsyncIOMotorDatabase, tickets: Iterable[dict]):
+    """Add newly inserted tickets to the counters in one atomic update."""
+    increments = Counter()
+    for ticket in tickets:
+        increments["total"] += 1
+        increments.update(_paths(ticket, ticket["status"]))
+    await _apply(db, increments)
+
+
+async def count_status_change(db: AsyncIOMotorDatabase, ticket: dict, old_status: str, new_status: str):
+    """Move one ticket from `old_status` to `new_status` in every breakdown."""
+    increments = Counter(_paths(ticket, new_status))
+    increments.subtract(_paths(ticket, old_status))
+    await _apply(db, increments)
+
+
+# -------------------------
+# Reads
+# -------------------------
+def _decode(counts: dict) -> dict:
+    decoded = {}
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            nested = _decode(value)
+            if nested:
+                decoded[unquote(key)] = nested
+        elif value:
+            decoded[unquote(key)] = value
+    return decoded
+
+
+async def get_ticket_stats(db: AsyncIOMotorDatabase) -> dict:
+    stats = await db.ticket_stats.find_one({"_id": TICKET_STATS_ID}) or {}
+    return {
+        "total": stats.get("total", 0),
+        "by_status": _decode(stats.get("by_status", {})),
+        "by_agent": _decode(stats.get("by_agent", {})),
+        "by_creator": _decode(stats.get("by_creator", {})),
+        "reconciled_at": stats.get("reconciled_at"),
+    }
+
+
+# -------------------------
+# Reconciliation
+# -------------------------
+def _flatten(counts: dict, prefix: str = "") -> dict[str, int]:
+    """Dotted path -> count, the form $inc takes."""
+    paths = {}
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            paths.update(_flatten(value, f"{prefix}{key}."))
+        elif value:
+            paths[f"{prefix}{key}"] = value
+    return paths
+
+
+async def _count_tickets(db: AsyncIOMotorDatabase, session=None) -> dict:
+    pipeline = [{"$facet": {
+        "total": [{"$count": "count"}],
+        "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+        "by_agent": [{"$group": {"_id": {"who": "$assigned_to", "status": "$status"}, "count": {"$sum": 1}}}],
+        "by_creator": [{"$group": {"_id": {"who": "$created_by", "status": "$status"}, "count": {"$sum": 1}}}],
+    }}]
+    result = (await db.tickets.aggregate(pipeline, allowDiskUse=True, session=session).to_list(length=1))[0]
+
+    counts = {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "by_status": {_key(row["_id"]): row["count"] for row in result["by_status"]},
+        "by_agent": {},
+        "by_creator": {},
+    }
+    for breakdown in ("by_agent", "by_creator"):
+        for row in result[breakdown]:
+            who = counts[breakdown].setdefault(_key(row["_id"].get("who")), {})
+            who[_key(row["_id"].get("status"))] = row["count"]
+    return counts
+
+
+async def _read_counters_and_tickets(db: AsyncIOMotorDatabase, session=None) -> tuple[dict, dict]:
+    stored = await db.ticket_stats.find_one({"_id": TICKET_STATS_ID}, session=session) or {}
+    return {field: stored.get(field, 0) for field in _COUNTER_FIELDS}, await _count_tickets(db, session)
+
+
+async def rebuild_ticket_stats(db: AsyncIOMotorDatabase, attempts: int = TICKET_STATS_REBUILD_ATTEMPTS) -> bool:
+    """
+    Recompute the counters from the tickets collection and $inc the
+    document by the difference. The document and the aggregation are read
+    in one snapshot, so increments landing while the aggregation runs are
+    added on top instead of being overwritten. A ticket inserted but not yet
+    counted at the snapshot is counted twice until the next rebuild.
+    Without snapshot reads (standalone mongod) the two reads are separate.
+    Returns whether the counters were reconciled.
+    """
+    for _ in range(attempts):
+        try:
+            async with await db.client.start_session(snapshot=True) as session:
+                stored, counted = await _read_counters_and_tickets(db, session)
+            break
+        except OperationFailure as exc:
+            if exc.code in _SNAPSHOT_RETRY_CODES:
+                continue
+            logger.warning("Snapshot read failed (%s); reconciling ticket stats without one", exc)
+        except ConfigurationError as exc:
+            logger.warning("Snapshot reads unavailable (%s); reconciling ticket stats without one", exc)
+        stored, counted = await _read_counters_and_tickets(db)
+        break
+    else:
+        logger.warning("Ticket stats snapshot expired in %d rebuild attempts; counters left as they are", attempts)
+        return False
+
+    stored, counted = _flatten(stored), _flatten(counted)
+    increments = {path: counted.get(path, 0) - stored.get(path, 0) for path in stored.keys() | counted.keys()}
+    update = {"$set": {"reconciled_at": datetime.utcnow()}}
+    increments = {path: delta for path, delta in increments.items() if delta}
+    if increments:
+        update["$inc"] = increments
+    await db.ticket_stats.update_one({"_id": TICKET_STATS_ID}, update, upsert=True)
+    return True
+
+
+async def run_stats_reconciler(db: AsyncIOMotorDatabase, interval: float = TICKET_STATS_RECONCILE_SECONDS):
+    """
+    Background task: build the counters if they were never reconciled, then
+    rebuild every `interval` seconds. A document created by increments alone
+    (an existing database after deploy) still gets its first build.
+    """
+    first_run = True
+    while True:
+        try:
+            reconciled = {"_id": TICKET_STATS_ID, "reconciled_at": {"$exists": True}}
+            if not first_run or await db.ticket_stats.find_one(reconciled, {"_id": 1}) is None:
+                await rebuild_ticket_stats(db)
+        except PyMongoError as exc:
+            logger.warning("Ticket stats reconciliation failed: %s", exc)
+        first_run = False
+        await asyncio.sleep(interval)
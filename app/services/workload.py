@@ -0,0 +1,67 @@
+# app/services/workload.py
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateMany, UpdateOne
+
+TICKET_STATUSES = ("open", "in_progress", "resolved", "closed")
+# Statuses that still count towards an agent's open workload
+OPEN_STATUSES = frozenset({"open", "in_progress"})
+
+
+def is_open_status(status: str) -> bool:
+    return status in OPEN_STATUSES
+
+
+async def adjust_open_tickets(db: AsyncIOMotorDatabase, agent_email: str, delta: int):
+    """Atomically move an agent's `open_tickets` counter by `delta`."""
+    if delta:
+        await db.agents.update_one({"email": agent_email}, {"$inc": {"open_tickets": delta}})
+
+
+async def adjust_open_tickets_many(db: AsyncIOMotorDatabase, deltas: dict[str, int]):
+    """Apply several per-agent counter moves in one bulk write."""
+    updates = [
+        UpdateOne({"email": agent_email}, {"$inc": {"open_tickets": delta}})
+        for agent_email, delta in deltas.items()
+        if delta
+    ]
+    if updates:
+        await db.agents.bulk_write(updates, ordered=False)
+
+
+async def record_status_change(db: AsyncIOMotorDatabase, agent_email: str, old_status: str, new_status: str):
+    """Keep the agent's open counter in step with a ticket status transition."""
+    delta = int(is_open_status(new_status)) - int(is_open_status(old_status))
+    await adjust_open_tickets(db, agent_email, delta)
+
+
+async def recompute_open_tickets(db: AsyncIOMotorDatabase) -> dict[str, int]:
+    """
+    Rebuild every agent's `open_tickets` from the tickets collection.
+    A one-off backfill for tickets created before the counters existed; run
+    it while no tickets are being created, since it overwrites live counts.
+    """
+    pipeline = [
+        {"$match": {"status": {"$in": sorted(OPEN_STATUSES)}}},
+        {"$group": {"_id": "$assigned_to", "count": {"$sum": 1}}},
+    ]
+    counts = {row["_id"]: row["count"] async for row in db.tickets.aggregate(pipeline) if row["_id"]}
+
+    updates = [UpdateOne({"email": email}, {"$set": {"open_tickets": count}}) for email, count in counts.items()]
+    updates.append(UpdateMany({"email": {"$nin": list(counts)}}, {"$set": {"open_tickets": 0}}))
+    await db.agents.bulk_write(updates, ordered=False)
+    return counts
+
+
+async def _main():
+    from app.db import db
+
+    counts = await recompute_open_tickets(db)
+    for email, count in sorted(counts.items()):
+        print(f"{email}: {count} open")
+    print("✅ Recomputed open_tickets for every agent")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,106 @@
+# app/services/write_coalescer.py
+import asyncio
+import os
+from typing import Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+
+# Opt-in: coalesce concurrent ticket inserts into shared insert_many calls
+TICKET_WRITE_COALESCING = os.getenv("TICKET_WRITE_COALESCING", "").lower() in ("1", "true", "yes")
+TICKET_WRITE_COALESCE_WINDOW_MS = float(os.getenv("TICKET_WRITE_COALESCE_WINDOW_MS", 2))
+TICKET_WRITE_COALESCE_MAX_BATCH = int(os.getenv("TICKET_WRITE_COALESCE_MAX_BATCH", 100))
+
+
+class WriteCoalescer:
+    """
+    Collects inserts that arrive within `window_ms` (or until `max_batch`
+    documents are waiting) and writes them with one unordered insert_many.
+    Each caller gets back its own `_id`, or its own write error.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, window_ms: float, max_batch: int):
+        self.collection = collection
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: set[asyncio.Task] = set()
+        self._closed = False
+
+    async def insert(self, document: dict) -> ObjectId:
+        """Queue `document` for the next batch; sets and returns its `_id`."""
+        if self._closed:
+            raise RuntimeError("Write coalescer is closed")
+
+        loop = asyncio.get_running_loop()
+        document.setdefault("_id", ObjectId())
+        future = loop.create_future()
+        self._pending.append((document, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._write(batch))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list[tuple[dict, asyncio.Future]]):
+        errors = {}
+        try:
+            await self.collection.insert_many([document for document, _ in batch], ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                error_class = DuplicateKeyError if error.get("code") == 11000 else WriteError
+                errors[error["index"]] = error_class(error.get("errmsg"), error.get("code"), error)
+        except Exception as exc:
+            errors = {index: exc for index in range(len(batch))}
+
+        for index, (document, future) in enumerate(batch):
+            if future.done():  # caller went away
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(document["_id"])
+
+    async def close(self):
+        """Stop accepting inserts and wait until every queued one is written."""
+        self._closed = True
+        self._flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+
+_ticket_writer: Optional[WriteCoalescer] = None
+
+
+def get_ticket_writer(db: AsyncIOMotorDatabase) -> Optional[WriteCoalescer]:
+    """The tickets coalescer, or None when TICKET_WRITE_COALESCING is off."""
+    global _ticket_writer
+    if not TICKET_WRITE_COALESCING:
+        return None
+    if _ticket_writer is None:
+        _ticket_writer = WriteCoalescer(
+            db["tickets"], TICKET_WRITE_COALESCE_WINDOW_MS, TICKET_WRITE_COALESCE_MAX_BATCH
+        )
+    return _ticket_writer
+
+
+async def close_ticket_writer():
+    global _ticket_writer
+    if _ticket_writer is not None:
+        await _ticket_writer.close()
+        _ticket_writer = None
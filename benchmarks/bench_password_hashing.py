@@ -0,0 +1,88 @@
+# benchmarks/bench_password_hashing.py
+"""
+Event-loop latency while many logins verify passwords at once.
+
+Compares verifying inline on the event loop (the old login path) with the
+pooled `verify_and_update_password_async` path. A probe task sleeps for a
+fixed tick and records how late it wakes up; that lateness is what every
+other request on the worker would see.
+
+    python -m benchmarks.bench_password_hashing --logins 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Let the benchmark queue every login instead of shedding load with 503s
+os.environ.setdefault("PASSWORD_HASH_MAX_PENDING", "100000")
+
+from app.auth import (  # noqa: E402
+    get_password_hash,
+    shutdown_password_hashing,
+    verify_and_update_password_async,
+    verify_password,
+)
+
+PROBE_TICK = 0.005
+
+
+def percentile(sorted_samples: list[float], q: float) -> float:
+    index = min(len(sorted_samples) - 1, int(len(sorted_samples) * q))
+    return sorted_samples[index]
+
+
+async def probe_loop_lag(stop: asyncio.Event, samples: list[float]):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_TICK)
+        samples.append(time.perf_counter() - started - PROBE_TICK)
+
+
+async def inline_login(password: str, hashed: str):
+    await asyncio.sleep(0)
+    verify_password(password, hashed)
+
+
+async def pooled_login(password: str, hashed: str):
+    await verify_and_update_password_async(password, hashed)
+
+
+async def run_scenario(login, logins: int, hashed: str) -> dict:
+    samples: list[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(stop, samples))
+    await asyncio.sleep(PROBE_TICK * 2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login("correct horse", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    samples.sort()
+    return {
+        "logins_per_sec": logins / elapsed,
+        "lag_p50_ms": percentile(samples, 0.50) * 1000,
+        "lag_p99_ms": percentile(samples, 0.99) * 1000,
+        "lag_max_ms": samples[-1] * 1000,
+    }
+
+
+async def main(logins: int):
+    hashed = get_password_hash("correct horse")
+    for name, login in (("inline", inline_login), ("pooled", pooled_login)):
+        result = await run_scenario(login, logins, hashed)
+        print(
+            f"{name:>7}: {result['logins_per_sec']:8.1f} logins/s  "
+            f"loop lag p50 {result['lag_p50_ms']:7.2f} ms  "
+            f"p99 {result['lag_p99_ms']:7.2f} ms  max {result['lag_max_ms']:7.2f} ms"
+        )
+    shutdown_password_hashing()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200, help="concurrent logins per scenario")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins))
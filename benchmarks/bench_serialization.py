@@ -0,0 +1,77 @@
+# benchmarks/bench_serialization.py
+"""
+Response encoding cost for a page of Mongo documents.
+
+"legacy" is the old list_tickets path: stringify `_id` in place, validate
+against `list[dict]`, run jsonable_encoder, then render a JSONResponse.
+"mongo_json" is MongoJSONResponse rendering the raw documents in one pass.
+
+    python -m benchmarks.bench_serialization --docs 10000
+"""
+import argparse
+import copy
+import time
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.serialization import MongoJSONResponse
+
+_list_of_dicts = TypeAdapter(list[dict])
+
+
+def sample_docs(count: int) -> list[dict]:
+    """Documents shaped like stored tickets (the legacy path only handles a top-level ObjectId)."""
+    return [
+        {
+            "_id": ObjectId(),
+            "title": f"Printer on floor {number % 12} is jammed",
+            "description": "Paper keeps folding at the second tray. " * 3,
+            "created_by": f"user{number % 500}@example.com",
+            "assigned_to": f"agent{number % 7}@example.com",
+            "status": "open" if number % 3 else "resolved",
+        }
+        for number in range(count)
+    ]
+
+
+def legacy_path(docs: list[dict]) -> bytes:
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    validated = _list_of_dicts.validate_python(docs)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def mongo_json_path(docs: list[dict]) -> bytes:
+    return MongoJSONResponse(docs).body
+
+
+def best_of(render, docs: list[dict], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        batch = copy.deepcopy(docs)  # legacy mutates its input
+        started = time.perf_counter()
+        render(batch)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(count: int, repeat: int):
+    docs = sample_docs(count)
+    results = {name: best_of(render, docs, repeat) for name, render in (
+        ("legacy", legacy_path),
+        ("mongo_json", mongo_json_path),
+    )}
+    for name, seconds in results.items():
+        print(f"{name:>10}: {seconds * 1000:8.2f} ms for {count} docs")
+    print(f"   speedup: {results['legacy'] / results['mongo_json']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.docs, args.repeat)
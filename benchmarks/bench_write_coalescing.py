@@ -0,0 +1,116 @@
+# benchmarks/bench_write_coalescing.py
+"""
+Ticket insert throughput and latency: one insert_one per request versus the
+WriteCoalescer batching concurrent inserts into insert_many.
+
+Runs against MONGODB_URI (a scratch collection in the `helpdesk_bench`
+database), or against a simulated collection that models a fixed network
+round trip and a bounded connection pool when --simulated-rtt-ms is given.
+
+    python -m benchmarks.bench_write_coalescing --inserts 5000 --concurrency 500
+    python -m benchmarks.bench_write_coalescing --simulated-rtt-ms 1
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from bson import ObjectId
+
+from app.services.write_coalescer import WriteCoalescer
+
+
+class SimulatedCollection:
+    """Each call checks out one of `pool_size` connections for one round trip."""
+
+    def __init__(self, rtt_ms: float, pool_size: int):
+        self.rtt = rtt_ms / 1000
+        self._pool = asyncio.Semaphore(pool_size)
+
+    async def insert_one(self, document: dict):
+        async with self._pool:
+            document.setdefault("_id", ObjectId())
+            await asyncio.sleep(self.rtt)
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True):
+        async with self._pool:
+            for document in documents:
+                document.setdefault("_id", ObjectId())
+            await asyncio.sleep(self.rtt)
+
+
+def percentile(sorted_samples: list[float], q: float) -> float:
+    index = min(len(sorted_samples) - 1, int(len(sorted_samples) * q))
+    return sorted_samples[index]
+
+
+def ticket(number: int) -> dict:
+    return {
+        "title": f"Benchmark ticket {number}",
+        "description": "write coalescing benchmark",
+        "created_by": "bench@example.com",
+        "assigned_to": "agentA@example.com",
+        "status": "open",
+    }
+
+
+async def run_scenario(insert, inserts: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(number: int):
+        async with gate:
+            started = time.perf_counter()
+            await insert(ticket(number))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(number) for number in range(inserts)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "inserts_per_sec": inserts / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def main(args):
+    client = None
+    if args.simulated_rtt_ms is not None:
+        collection = SimulatedCollection(args.simulated_rtt_ms, args.pool_size)
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(os.getenv("MONGODB_URI"), maxPoolSize=args.pool_size)
+        collection = client["helpdesk_bench"]["tickets_write_coalescing"]
+        await collection.drop()
+
+    coalescer = WriteCoalescer(collection, args.window_ms, args.max_batch)
+    scenarios = (
+        ("insert_one", collection.insert_one),
+        ("coalesced", coalescer.insert),
+    )
+    for name, insert in scenarios:
+        result = await run_scenario(insert, args.inserts, args.concurrency)
+        print(
+            f"{name:>10}: {result['inserts_per_sec']:9.1f} inserts/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms"
+        )
+    await coalescer.close()
+
+    if client is not None:
+        await collection.drop()
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--inserts", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500, help="inserts in flight at once")
+    parser.add_argument("--window-ms", type=float, default=2)
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=100, help="connection pool size")
+    parser.add_argument("--simulated-rtt-ms", type=float, help="use an in-process collection with this round trip")
+    asyncio.run(main(parser.parse_args()))
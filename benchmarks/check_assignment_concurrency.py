@@ -0,0 +1,92 @@
+# benchmarks/check_assignment_concurrency.py
+"""
+Concurrency check for ticket assignment: fire N `POST /tickets/` calls at
+once and fail unless every agent ended up within one ticket of the others.
+
+Each request goes through the real app (auth, assignment strategy, insert)
+via httpx's ASGI transport. The check also verifies that the agents'
+`open_tickets` counters add up to the number of tickets created.
+
+    python -m benchmarks.check_assignment_concurrency --backend mongomock
+    python -m benchmarks.check_assignment_concurrency --mongodb-uri mongodb://localhost:27017
+
+The mongomock backend yields to the event loop around every collection
+call (see `_yield_between_mongomock_calls` in benchmarks/loadtest.py), so
+requests interleave there too and a read-modify-write assignment fails the
+check. A mongod run is still the reference for multi-worker deployments.
+
+Exits non-zero on any failed request, a spread above --max-spread or a
+counter mismatch. Needs `pip install -r requirements-dev.txt`.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from collections import Counter
+
+from benchmarks.loadtest import BENCH_DB, configure, login_token, seed
+
+
+async def main(args) -> int:
+    os.environ["ASSIGNMENT_STRATEGY"] = args.strategy
+    configure(args)
+    import httpx
+
+    from app.db import client as mongo_client, db
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        await seed(db, args.agents)
+        await db.tickets.delete_many({})
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=None) as client:
+            token = await login_token(client, "assignment-check@example.com")
+            headers = {"Authorization": f"Bearer {token}"}
+
+            async def create(number: int):
+                return await client.post("/tickets/", headers=headers,
+                                         json={"title": f"Concurrent {number}", "description": "assignment check"})
+
+            # All requests in flight at once: no client-side throttling
+            responses = await asyncio.gather(*(create(n) for n in range(args.tickets)))
+
+        agents = await db.agents.find({}, {"email": 1, "open_tickets": 1}).to_list(length=None)
+
+    if args.backend == "mongod" and not args.keep_data:
+        await mongo_client.drop_database(BENCH_DB)
+
+    failures = [response for response in responses if response.status_code not in (200, 201)]
+    assigned = Counter({agent["email"]: 0 for agent in agents})
+    assigned.update(response.json()["assigned_to"] for response in responses if response not in failures)
+    spread = max(assigned.values()) - min(assigned.values())
+    open_total = sum(agent.get("open_tickets", 0) for agent in agents)
+
+    print(f"strategy={args.strategy} tickets={args.tickets} agents={len(agents)} failures={len(failures)}")
+    for email, count in sorted(assigned.items()):
+        print(f"  {email}: {count}")
+    print(f"spread (max - min) = {spread}, open_tickets total = {open_total}")
+
+    problems = []
+    if failures:
+        problems.append(f"{len(failures)} request(s) failed, first status {failures[0].status_code}")
+    if spread > args.max_spread:
+        problems.append(f"spread {spread} > {args.max_spread}")
+    if open_total != args.tickets - len(failures):
+        problems.append(f"open_tickets total {open_total} != {args.tickets - len(failures)} created")
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if not problems:
+        print("OK")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backend", choices=("mongod", "mongomock"), default="mongod")
+    parser.add_argument("--mongodb-uri", default=os.getenv("LOADTEST_MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--strategy", choices=("round_robin", "least_open"), default="round_robin")
+    parser.add_argument("--tickets", type=int, default=1000)
+    parser.add_argument("--agents", type=int, default=3)
+    parser.add_argument("--max-spread", type=int, default=1)
+    parser.add_argument("--keep-data", action="store_true", help="do not drop the benchmark database")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,339 @@
+# benchmarks/loadtest.py
+"""
+Load-test scenarios for the ticketing API, run in-process against `app.main.app`.
+
+Requests go through httpx's ASGI transport, so the numbers cover routing,
+auth, serialization and MongoDB, but not the network. Each scenario reports
+throughput, p50/p99 latency and Mongo commands per request (counted by the
+CommandListener in app/metrics.py). Results can be saved as a baseline and
+later runs compared against it.
+
+    python -m benchmarks.loadtest --save benchmarks/baseline.json
+    python -m benchmarks.loadtest --compare benchmarks/baseline.json
+    python -m benchmarks.loadtest --backend mongomock --scenarios create_list_mix
+
+Backends: "mongod" uses --mongodb-uri (a scratch database that is dropped
+afterwards); "mongomock" yields to the event loop around each call so
+requests interleave, and cannot count round trips. Install the extras with
+`pip install -r requirements-dev.txt`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+BENCH_DB = "helpdesk_loadtest"
+PASSWORD = "load-test-password"
+
+
+# -------------------------
+# Environment
+# -------------------------
+def configure(args):
+    """Point the app at the benchmark database; must run before importing app.*"""
+    os.environ["MONGODB_URI"] = args.mongodb_uri
+    os.environ["MONGODB_DB"] = BENCH_DB
+    os.environ.setdefault("JWT_SECRET", "load-test-secret")
+    os.environ["TICKET_STATS_RECONCILE_SECONDS"] = "0"
+
+    if args.backend == "mongomock":
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+
+        _yield_between_mongomock_calls()
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+
+def _yield_between_mongomock_calls():
+    """
+    mongomock finishes every call without suspending, so concurrent requests
+    never interleave and read-modify-write races can't show up. Yield to the
+    event loop before and after each collection call and cursor read, as a
+    round trip to mongod would.
+    """
+    import inspect
+
+    import mongomock_motor
+
+    def interleaved(method):
+        async def wrapper(*args, **kwargs):
+            await asyncio.sleep(0)
+            result = await method(*args, **kwargs)
+            await asyncio.sleep(0)
+            return result
+        wrapper.interleaved = True
+        return wrapper
+
+    classes = (mongomock_motor.AsyncMongoMockCollection, mongomock_motor.AsyncCursor,
+               mongomock_motor.AsyncCommandCursor, mongomock_motor.AsyncLatentCommandCursor)
+    for cls in classes:
+        for name, method in inspect.getmembers(cls, inspect.iscoroutinefunction):
+            if name != "__anext__" and not getattr(method, "interleaved", False):
+                setattr(cls, name, interleaved(method))
+        if hasattr(cls, "__anext__"):
+            cls.__anext__ = cls.next
+
+
+def percentile(sorted_samples: list[float], q: float) -> float:
+    index = min(len(sorted_samples) - 1, int(len(sorted_samples) * q))
+    return sorted_samples[index]
+
+
+class Recorder:
+    """Latencies and failures for one scenario, plus Mongo command deltas."""
+
+    def __init__(self, registry, count_round_trips: bool):
+        self.registry = registry
+        self.count_round_trips = count_round_trips
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.extra: dict = {}
+
+    async def call(self, client, method: str, url: str, expect=(200, 201), **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies.append(time.perf_counter() - started)
+        if response.status_code not in expect:
+            self.errors += 1
+        return response
+
+    async def run(self, coroutines):
+        commands_before = self.registry.request_db_commands()
+        started = time.perf_counter()
+        await asyncio.gather(*coroutines)
+        elapsed = time.perf_counter() - started
+        commands = self.registry.request_db_commands() - commands_before
+
+        self.latencies.sort()
+        requests = len(self.latencies)
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "throughput_rps": round(requests / elapsed, 2),
+            "p50_ms": round(percentile(self.latencies, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 3),
+            "db_round_trips_per_request": round(commands / requests, 2) if self.count_round_trips else None,
+            **self.extra,
+        }
+
+
+def bounded(concurrency: int, jobs):
+    """Wrap job factories so at most `concurrency` run at once."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with gate:
+            await job()
+
+    return [run(job) for job in jobs]
+
+
+# -------------------------
+# Setup
+# -------------------------
+async def seed(db, agents: int):
+    await db.agents.delete_many({})
+    await db.agents.insert_many([
+        {"name": f"Load Agent {n}", "email": f"load-agent{n}@example.com", "is_active": True, "open_tickets": 0}
+        for n in range(agents)
+    ])
+    from app.services.assignment import bump_agents_version
+
+    await bump_agents_version(db)
+
+
+async def login_token(client, email: str) -> str:
+    await client.post("/auth/signup", json={"name": "Load Tester", "email": email, "password": PASSWORD})
+    response = await client.post("/auth/login", data={"username": email, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+# -------------------------
+# Scenarios
+# -------------------------
+async def signup_login_storm(client, db, recorder: Recorder, args, headers):
+    # Runs with the production PASSWORD_HASH_MAX_PENDING, so 503s from the
+    # hash pool's load shedding are expected and reported as `shed_rate`
+    run_id = time.time_ns()
+    recorder.extra["shed"] = 0
+
+    def job(number: int):
+        async def signup_then_login():
+            email = f"storm{run_id}-{number}@example.com"
+            response = await recorder.call(client, "POST", "/auth/signup", expect=(200, 201, 503),
+                                           json={"name": "Storm", "email": email, "password": PASSWORD})
+            if response.status_code == 503:
+                recorder.extra["shed"] += 1
+                return
+            response = await recorder.call(client, "POST", "/auth/login", expect=(200, 503),
+                                           data={"username": email, "password": PASSWORD})
+            if response.status_code == 503:
+                recorder.extra["shed"] += 1
+        return signup_then_login
+
+    result = await recorder.run(bounded(args.concurrency, [job(n) for n in range(args.users)]))
+    result["shed_rate"] = round(result["shed"] / result["requests"], 4) if result["requests"] else 0.0
+    return result
+
+
+async def create_list_mix(client, db, recorder: Recorder, args, headers):
+    # 80% creates, 20% first-page lists
+    def job(number: int):
+        async def request():
+            if number % 5:
+                await recorder.call(client, "POST", "/tickets/", headers=headers,
+                                    json={"title": f"Mix {number}", "description": "load test"})
+            else:
+                await recorder.call(client, "GET", "/tickets/?limit=50", headers=headers)
+        return request
+
+    return await recorder.run(bounded(args.concurrency, [job(n) for n in range(args.requests)]))
+
+
+async def large_list(client, db, recorder: Recorder, args, headers):
+    existing = await db.tickets.count_documents({})
+    missing = max(0, args.list_size - existing)
+    for start in range(0, missing, 5000):
+        await db.tickets.insert_many([
+            {"title": f"Bulk {n}", "description": "x" * 200, "created_by": "seed@example.com",
+             "assigned_to": "load-agent0@example.com", "status": "open"}
+            for n in range(start, min(missing, start + 5000))
+        ])
+
+    async def page_through():
+        after = None
+        pages = 0
+        while True:
+            url = "/tickets/?limit=1000" + (f"&after={after}" if after else "")
+            response = await recorder.call(client, "GET", url, headers=headers)
+            pages += 1
+            after = response.headers.get("X-Next-After")
+            if not after:
+                break
+        recorder.extra["pages"] = pages
+
+    async def stream_all():
+        response = await recorder.call(client, "GET", "/tickets/?format=ndjson", headers=headers)
+        recorder.extra["streamed_bytes"] = len(response.content)
+
+    return await recorder.run([page_through(), stream_all()])
+
+
+async def concurrent_assignment(client, db, recorder: Recorder, args, headers):
+    def job(number: int):
+        async def create():
+            response = await recorder.call(client, "POST", "/tickets/", headers=headers,
+                                           json={"title": f"Assign {number}", "description": "load test"})
+            if response.status_code in (200, 201):
+                assigned[response.json()["assigned_to"]] += 1
+        return create
+
+    assigned = Counter()
+    result = await recorder.run(bounded(args.concurrency, [job(n) for n in range(args.tickets)]))
+    result["assignment_spread"] = max(assigned.values()) - min(assigned.values()) if assigned else None
+    return result
+
+
+SCENARIOS = {
+    "signup_login_storm": signup_login_storm,
+    "create_list_mix": create_list_mix,
+    "large_list": large_list,
+    "concurrent_assignment": concurrent_assignment,
+}
+
+
+# -------------------------
+# Baselines
+# -------------------------
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Regressions: throughput down, or p99, db round trips per request or the
+    load-shedding rate up, by more than `tolerance`.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput_rps']} < {previous['throughput_rps']}")
+        if current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {current['p99_ms']} ms > {previous['p99_ms']} ms")
+        before, after = previous.get("db_round_trips_per_request"), current.get("db_round_trips_per_request")
+        if before is not None and after is not None and after > before * (1 + tolerance):
+            regressions.append(f"{name}: db round trips/request {after} > {before}")
+        before, after = previous.get("shed_rate"), current.get("shed_rate")
+        if before is not None and after is not None and after > before * (1 + tolerance):
+            regressions.append(f"{name}: shed rate {after} > {before}")
+    return regressions
+
+
+async def main(args) -> int:
+    configure(args)
+    import httpx
+
+    from app.db import client as mongo_client, db
+    from app.main import app
+    from app.metrics import registry
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        await seed(db, args.agents)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            token = await login_token(client, "load-tester@example.com")
+            headers = {"Authorization": f"Bearer {token}"}
+
+            for name in args.scenarios:
+                recorder = Recorder(registry, count_round_trips=args.backend == "mongod")
+                results[name] = await SCENARIOS[name](client, db, recorder, args, headers)
+                print(f"{name:>22}: {json.dumps(results[name])}")
+
+    if args.backend == "mongod" and not args.keep_data:
+        await mongo_client.drop_database(BENCH_DB)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "parameters": {key: getattr(args, key) for key in ("concurrency", "users", "requests", "list_size", "tickets", "agents")},
+        "scenarios": results,
+    }
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backend", choices=("mongod", "mongomock"), default="mongod")
+    parser.add_argument("--mongodb-uri", default=os.getenv("LOADTEST_MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200, help="signup_login_storm users")
+    parser.add_argument("--requests", type=int, default=2000, help="create_list_mix requests")
+    parser.add_argument("--list-size", type=int, default=100000, help="tickets present for large_list")
+    parser.add_argument("--tickets", type=int, default=1000, help="concurrent_assignment tickets")
+    parser.add_argument("--agents", type=int, default=3)
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--keep-data", action="store_true", help="do not drop the benchmark database")
+    sys.exit(asyncio.run(main(parser.parse_args())))